@@ -2,8 +2,8 @@
 # Copyright 2016-2024 Matthew Wall
 # Distributed under the terms of the GNU Public License (GPLv3)
 """
-Collect data from stl-sdr.  Run rtl_433 on a thread and push the output onto
-a queue.
+Collect data from stl-sdr.  Run rtl_433 as a subprocess and read its output
+without blocking.
 
 The SDR detects many different sensors and sensor types, so this driver
 includes a mechanism to filter the incoming data, and to map the filtered
@@ -91,30 +91,35 @@ in the JSON data, for example 'wind_speed_mph' instead of just 'wind_speed'.
 # can recognize anything rtl_433 spits out
 
 from __future__ import with_statement
-from calendar import timegm
-try:
-    # Python 3
-    import queue
-except ImportError:
-    # Python 2:
-    import Queue as queue
+from calendar import monthrange, timegm
+import collections
+import errno
+import fcntl
 import fnmatch
 import os
 import re
+import select
+import shlex
 import subprocess
 import threading
 import time
-import copy
 
+# use the fastest json decoder that is installed.  only loads is used.
 try:
-    import cjson as json
-    setattr(json, 'dumps', json.encode)
-    setattr(json, 'loads', json.decode)
-except (ImportError, AttributeError):
+    import orjson as json
+except ImportError:
     try:
-        import simplejson as json
+        import ujson as json
     except ImportError:
-        import json
+        try:
+            import cjson as json
+            setattr(json, 'dumps', json.encode)
+            setattr(json, 'loads', json.decode)
+        except (ImportError, AttributeError):
+            try:
+                import simplejson as json
+            except ImportError:
+                import json
 
 import weewx.drivers
 import weewx.units
@@ -141,7 +146,7 @@ except ImportError:
 
     def logmsg(level, msg):
         syslog.syslog(level, 'sdr: %s: %s' %
-                      (threading.currentThread().getName(), msg))
+                      (threading.current_thread().name, msg))
 
     def logdbg(msg):
         logmsg(syslog.LOG_DEBUG, msg)
@@ -155,6 +160,11 @@ except ImportError:
 DRIVER_NAME = 'SDR'
 DRIVER_VERSION = '0.96b1'
 
+# debug messages in the parsing path are formatted only when this is set.  the
+# driver sets it from the weewx debug option, the command-line tool from the
+# --debug option.
+DEBUG = False
+
 # The default command requests json output from every decoder
 # Use the -R option to indicate specific decoders
 
@@ -210,39 +220,96 @@ def kmh_to_mps(v):
     return v
 
 
-class AsyncReader(threading.Thread):
+# convert a 'YYYY-MM-DD HH:MM:SS' time in UTC to epoch seconds.  the format is
+# fixed width, so pick out the fields by position instead of using strptime,
+# which is slow and takes a lock on every call.  consecutive timestamps are
+# nearly always on the same day, so remember the epoch of midnight for the
+# last few dates and just add the time of day.  reject anything that strptime
+# would reject.  int() accepts signs and spaces, so check for digits first.
+# the date is checked only when it is not already in the cache.
+MIDNIGHT_CACHE = dict()
+
+def utc_to_epoch(s):
+    if len(s) != 19 or s[4] != '-' or s[7] != '-' or s[10] != ' ' or \
+            s[13] != ':' or s[16] != ':' or \
+            not (s[11:13] + s[14:16] + s[17:19]).isdigit():
+        raise ValueError("unrecognized timestamp '%s'" % s)
+    hour, minute, second = int(s[11:13]), int(s[14:16]), int(s[17:19])
+    if not (hour <= 23 and minute <= 59 and second <= 61):
+        raise ValueError("timestamp out of range '%s'" % s)
+    date = s[0:10]
+    midnight = MIDNIGHT_CACHE.get(date)
+    if midnight is None:
+        if not (s[0:4] + s[5:7] + s[8:10]).isdigit():
+            raise ValueError("unrecognized timestamp '%s'" % s)
+        year, month, day = int(s[0:4]), int(s[5:7]), int(s[8:10])
+        if not (1 <= month <= 12 and 1 <= day <= monthrange(year, month)[1]):
+            raise ValueError("timestamp out of range '%s'" % s)
+        midnight = timegm((year, month, day, 0, 0, 0))
+        if len(MIDNIGHT_CACHE) > 8:
+            MIDNIGHT_CACHE.clear()
+        MIDNIGHT_CACHE[date] = midnight
+    return midnight + hour * 3600 + minute * 60 + second
+
+
+# the plain text (non-json) output has values such as '21.3 C' or '60 %'.  the
+# number always comes first, so split off the unit instead of using a regex.
+def float_head(v):
+    return float(v.partition(' ')[0])
+
+# rtl_433 reports some status flags, such as battery, as 'OK' or 'LOW'.  map
+# these to the WeeWX convention of 0=OK 1=notOK
+def battery_status(v):
+    return 0 if v == 'OK' else 1
+
+
+# the timestamps from rtl_433 are always 'YYYY-MM-DD HH:MM:SS' at the start of
+# the plain text line or of the json time field, so look for them by position
+# instead of with a regex.  the shape must be exactly that, digits included,
+# so that other formats such as '-M time:iso' are treated as no timestamp
+# instead of failing in utc_to_epoch.  the ranges of the fields are checked by
+# utc_to_epoch.
+def has_timestamp(s):
+    return (len(s) >= 19 and s[4] == '-' and s[7] == '-' and s[10] == ' ' and
+            s[13] == ':' and s[16] == ':' and
+            (s[0:4] + s[5:7] + s[8:10] + s[11:13] + s[14:16] +
+             s[17:19]).isdigit())
+
+# split a plain text line into the timestamp and the payload that follows it,
+# with any colons in between removed.  this is used both to find where each
+# group of lines starts and to parse the first line.
+def split_timestamp(line):
+    if has_timestamp(line) and line[19:20].isspace():
+        return line[:19], line[19:].lstrip().lstrip(':').strip()
+    return None, None
 
-    def __init__(self, fd, queue, label):
-        threading.Thread.__init__(self)
-        self._fd = fd
-        self._queue = queue
-        self._running = False
-        self.setDaemon(True)
-        self.setName(label)
 
-    def run(self):
-        logdbg("start async reader for %s" % self.getName())
-        self._running = True
-        for line in iter(self._fd.readline, ''):
-            if line:
-                self._queue.put(line)
-            if not self._running:
-                break
+class ProcManager(object):
+    # how long to wait for output before handing off a partial group of lines
+    TIMEOUT = 3
 
-    def stop_running(self):
-        self._running = False
+    # maximum number of bytes to read from a pipe at once
+    READ_SIZE = 65536
 
+    # maximum number of stderr lines to keep until they are reported.  when
+    # there are more than this, the oldest lines are discarded.
+    MAX_STDERR_LINES = 1000
 
-class ProcManager(object):
-    TS = re.compile('^\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d[\s]+')
+    # maximum number of bytes to keep while waiting for the end of a line.
+    # rtl_433 lines are much shorter than this, so anything longer is junk
+    # and is discarded instead of being kept in memory forever.
+    MAX_PARTIAL_LINE = 65536
 
     def __init__(self):
         self._cmd = None
         self._process = None
-        self.stdout_queue = queue.Queue()
-        self.stdout_reader = None
-        self.stderr_queue = queue.Queue()
-        self.stderr_reader = None
+        self._stdout_buf = bytearray()
+        self._stderr_buf = bytearray()
+        self._stdout_lines = []
+        self._stderr_lines = collections.deque(
+            maxlen=ProcManager.MAX_STDERR_LINES)
+        self._stderr_dropped = 0
+        self._open_fds = []
 
     def startup(self, cmd, path=None, ld_library_path=None):
         self._cmd = cmd
@@ -253,16 +320,17 @@ class ProcManager(object):
         if ld_library_path:
             env['LD_LIBRARY_PATH'] = ld_library_path
         try:
-            self._process = subprocess.Popen(cmd.split(' '),
+            self._process = subprocess.Popen(shlex.split(cmd),
                                              env=env,
                                              stdout=subprocess.PIPE,
                                              stderr=subprocess.PIPE)
-            self.stdout_reader = AsyncReader(
-                self._process.stdout, self.stdout_queue, 'stdout-thread')
-            self.stdout_reader.start()
-            self.stderr_reader = AsyncReader(
-                self._process.stderr, self.stderr_queue, 'stderr-thread')
-            self.stderr_reader.start()
+            # read the pipes without blocking, so that a single select can
+            # wait on both stdout and stderr instead of a thread for each.
+            self._open_fds = [self._process.stdout.fileno(),
+                              self._process.stderr.fileno()]
+            for fd in self._open_fds:
+                flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
         except (OSError, ValueError) as e:
             raise weewx.WeeWxIOError("failed to start process '%s': %s" %
                                      (cmd, e))
@@ -274,48 +342,132 @@ class ProcManager(object):
         self._process.stdout.close()
         logdbg("close stderr")
         self._process.stderr.close()
-        logdbg('shutdown %s' % self.stdout_reader.getName())
-        self.stdout_reader.stop_running()
-        self.stdout_reader.join(0.5)
-        logdbg('shutdown %s' % self.stderr_reader.getName())
-        self.stderr_reader.stop_running()
-        self.stderr_reader.join(0.5)
+        self._open_fds = []
+        # give the process a moment to go away
+        for _ in range(10):
+            if self._process.poll() is not None:
+                break
+            time.sleep(0.1)
         if self._process.poll() is None:
             logerr('process did not respond to kill, shutting down anyway')
         self._process = None
-        if self.stdout_reader.is_alive():
-            loginf('timed out waiting for %s' % self.stdout_reader.getName())
-        self.stdout_reader = None
-        if self.stderr_reader.is_alive():
-            loginf('timed out waiting for %s' % self.stderr_reader.getName())
-        self.stderr_reader = None
         loginf('shutdown complete')
 
     def running(self):
         return self._process.poll() is None
 
+    def _read(self, timeout):
+        # wait up to timeout seconds for output from the process, then read
+        # whatever is available.  complete lines are saved for get_stdout
+        # and get_stderr, partial lines are kept until the rest arrives.
+        # return whether there was anything to read.
+        ready, _, _ = select.select(self._open_fds, [], [], timeout)
+        for fd in ready:
+            try:
+                data = os.read(fd, ProcManager.READ_SIZE)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    continue
+                raise
+            if fd == self._process.stdout.fileno():
+                buf = self._stdout_buf
+                buf.extend(data)
+                ProcManager._split_lines(buf, self._stdout_lines, not data)
+            else:
+                buf = self._stderr_buf
+                buf.extend(data)
+                n = len(self._stderr_lines) + ProcManager._split_lines(
+                    buf, self._stderr_lines, not data)
+                if n > ProcManager.MAX_STDERR_LINES:
+                    self._stderr_dropped += n - ProcManager.MAX_STDERR_LINES
+            if len(buf) > ProcManager.MAX_PARTIAL_LINE:
+                logerr("discarded %s bytes of output with no end of line" %
+                       len(buf))
+                del buf[:]
+            if not data:
+                # end of file, so stop watching this pipe
+                self._open_fds.remove(fd)
+        return bool(ready)
+
+    @staticmethod
+    def _split_lines(buf, lines, eof=False):
+        # append each complete line in buf to lines, then remove them from
+        # buf.  the buffer is a bytearray that is modified in place, so a
+        # partial line is not copied again each time more data arrive.
+        # return the number of lines that were appended.
+        count = 0
+        start = 0
+        idx = buf.find(b'\n')
+        while idx >= 0:
+            lines.append(bytes(buf[start:idx + 1]))
+            count += 1
+            start = idx + 1
+            idx = buf.find(b'\n', start)
+        if eof and start < len(buf):
+            lines.append(bytes(buf[start:]))
+            count += 1
+            start = len(buf)
+        del buf[:start]
+        return count
+
     def get_stderr(self):
-        lines = []
-        while not self.stderr_queue.empty():
-            lines.append(self.stderr_queue.get().decode())
+        if self._open_fds:
+            self._read(0)
+        lines = [x.decode() for x in self._stderr_lines]
+        self._stderr_lines.clear()
+        if self._stderr_dropped:
+            lines.insert(0, "discarded %s lines of stderr output" %
+                         self._stderr_dropped)
+            self._stderr_dropped = 0
         return lines
 
     def get_stdout(self):
         lines = []
-        while self.running():
-            try:
-                # Fetch the output line. For it to be searched, Python 3
-                # requires that it be decoded to unicode. Decoding does no
-                # harm under Python 2:
-                line = self.stdout_queue.get(True, 3).decode()
-                m = ProcManager.TS.search(line)
-                if m and lines:
+        while True:
+            alive = self.running()
+            if alive:
+                end = time.time() + ProcManager.TIMEOUT
+                while not self._stdout_lines and self.running():
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+                    if self._open_fds:
+                        self._read(remaining)
+                    else:
+                        # both pipes are closed, so the process should be
+                        # exiting
+                        time.sleep(min(remaining, 0.1))
+            else:
+                # the process has exited, so pick up whatever it wrote before
+                # it went away, up to the end of each pipe.
+                while self._open_fds and self._read(0.1):
+                    pass
+            if not self._stdout_lines:
+                if not alive:
+                    break
+                yield lines
+                lines = []
+                continue
+            new_lines = self._stdout_lines
+            self._stdout_lines = []
+            for line in new_lines:
+                # For the line to be searched, Python 3 requires that it be
+                # decoded to unicode. Decoding does no harm under Python 2:
+                line = line.decode()
+                # each json object is a packet by itself, while a plain text
+                # packet starts with a timestamp and may span several lines.
+                is_json = line.startswith('{')
+                if lines and (is_json or split_timestamp(line)[0]):
                     yield lines
                     lines = []
                 lines.append(line)
-            except queue.Empty:
-                yield lines
-                lines = []
+                if is_json:
+                    # nothing more can belong to a json packet, so hand it off
+                    # now instead of waiting for the next line or the timeout.
+                    yield lines
+                    lines = []
+            if not alive:
+                break
         yield lines
 
 
@@ -332,16 +484,12 @@ class Packet:
     def parse_json(obj):
         return None
 
-    TS_PATTERN = re.compile('(\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d)')
-
     @staticmethod
     def parse_time(line):
         ts = None
         try:
-            m = Packet.TS_PATTERN.search(line)
-            if m:
-                utc = time.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
-                ts = timegm(utc)
+            if has_timestamp(line):
+                ts = utc_to_epoch(line[:19])
         except Exception as e:
             logerr("parse timestamp failed for '%s': %s" % (line, e))
         return ts
@@ -383,7 +531,7 @@ class Packet:
             if level is not None:
                 bs = 0 if level >= 1.0 else 1
         elif 'battery' in obj:
-            bs = 0 if obj.get('battery') == 'OK' else 1
+            bs = battery_status(obj['battery'])
         elif 'battery_low' in obj:
             bs = Packet.get_int(obj, 'battery_low')
         return bs
@@ -391,38 +539,40 @@ class Packet:
     @staticmethod
     def parse_lines(lines, parseinfo=None):
         # parse each line, splitting on colon for name:value
-        # tuple in parseinfo is label, pattern, lambda
+        # tuple in parseinfo is label, pattern, function
         # if there is a label, use it to transform the name
         # if there is a pattern, use it to match the value
-        # if there is a lamba, use it to convert the value
+        # if there is a function, use it to convert the value
         if parseinfo is None:
             parseinfo = dict()
         packet = dict()
         for line in lines[1:]:
-            if line.count(':') == 1:
+            (name, sep, value) = line.partition(':')
+            if sep and ':' not in value:
                 try:
-                    (name, value) = [x.strip() for x in line.split(':')]
+                    name = name.strip()
+                    value = value.strip()
                     if name in parseinfo:
-                        if parseinfo[name][1]:
-                            m = parseinfo[name][1].search(value)
+                        (label, pattern, func) = parseinfo[name]
+                        if pattern:
+                            m = pattern.search(value)
                             if m:
                                 value = m.group(1)
-                            else:
+                            elif DEBUG:
                                 logdbg("regex failed for %s:'%s'" %
                                        (name, value))
-                        if parseinfo[name][2]:
-                            value = parseinfo[name][2](value)
-                        if parseinfo[name][0]:
-                            name = parseinfo[name][0]
+                        if func:
+                            value = func(value)
+                        if label:
+                            name = label
                         packet[name] = value
-                    else:
+                    elif DEBUG:
                         logdbg("ignoring %s:%s" % (name, value))
                 except Exception as e:
                     logerr("parse failed for line '%s': %s" % (line, e))
-            else:
+            elif DEBUG:
                 logdbg("skip line '%s'" % line)
-        while lines:
-            lines.pop(0)
+        del lines[:]
         return packet
 
     @staticmethod
@@ -430,13 +580,15 @@ class Packet:
         # qualify each field name with details about the sensor.  not every
         # sensor has all three fields.
         # observation.<sensor_id>.<packet_type>
+        # the suffix is the same for every field, so format it only once.
         packet = dict()
         if 'dateTime' in pkt:
             packet['dateTime'] = pkt.pop('dateTime', 0)
         if 'usUnits' in pkt:
             packet['usUnits'] = pkt.pop('usUnits', 0)
+        suffix = ".%s.%s" % (sensor_id, packet_type)
         for n in pkt:
-            packet["%s.%s.%s" % (n, sensor_id, packet_type)] = pkt[n]
+            packet[n + suffix] = pkt[n]
         return packet
 
 
@@ -553,15 +705,18 @@ class Acurite5n1Packet(Packet):
 
     IDENTIFIER = "Acurite 5n1 sensor"
     PATTERN = re.compile('0x([0-9a-fA-F]+) Ch ([A-C]), (.*)')
-    RAIN = re.compile('Total rain fall since last reset: ([\d.]+)')
-    MSG = re.compile('Msg (\d+), (.*)')
-    MSG31 = re.compile('Wind ([\d.]+) kmph / ([\d.]+) mph ([\d.]+).*rain gauge ([\d.]+) in')
-    MSG38 = re.compile('Wind ([\d.]+) kmph / ([\d.]+) mph, ([\d.-]+) C ([\d.-]+) F ([\d.]+) % RH')
+    # one pattern for the rest of the line, so that it is searched only once
+    # whatever the message type.  the groups are:
+    #   1: message type
+    #   2,3,4,5: type 38 wind kmph, wind mph, temperature C, humidity
+    #   6,7,8,9: type 31 wind kmph, wind mph, wind direction, rain gauge
+    #   10: rain since last reset
+    MSG = re.compile(r'Msg (\d+), (?:.*?Wind ([\d.]+) kmph / ([\d.]+) mph, ([\d.-]+) C [\d.-]+ F ([\d.]+) % RH|.*?Wind ([\d.]+) kmph / ([\d.]+) mph ([\d.]+).*rain gauge ([\d.]+) in)?|Total rain fall since last reset: ([\d.]+)')
 
     @staticmethod
     def parse_text(ts, payload, lines):
         pkt = dict()
-        m = Acurite5n1Packet.PATTERN.search(lines[0])
+        m = Acurite5n1Packet.PATTERN.search(payload)
         if m:
             pkt['dateTime'] = ts
             pkt['usUnits'] = weewx.METRIC
@@ -569,42 +724,36 @@ class Acurite5n1Packet(Packet):
             pkt['channel'] = m.group(2)
             payload = m.group(3)
             m = Acurite5n1Packet.MSG.search(payload)
-            if m:
+            if m and m.group(1):
                 msg_type = m.group(1)
-                payload = m.group(2)
                 if msg_type == '31':
-                    m = Acurite5n1Packet.MSG31.search(payload)
-                    if m:
-                        pkt['wind_speed'] = float(m.group(1))
-                        pkt['wind_speed_mph'] = float(m.group(2))
-                        pkt['wind_dir'] = float(m.group(3))
-                        pkt['rain_total'] = float(m.group(4))
+                    if m.group(6):
+                        pkt['wind_speed'] = float(m.group(6))
+                        pkt['wind_speed_mph'] = float(m.group(7))
+                        pkt['wind_dir'] = float(m.group(8))
+                        pkt['rain_total'] = float(m.group(9))
                     else:
                         loginf("Acurite5n1Packet: no match for type 31: '%s'"
-                               % payload)
+                               % payload[m.end(1) + 2:])
                 elif msg_type == '38':
-                    m = Acurite5n1Packet.MSG38.search(payload)
-                    if m:
-                        pkt['wind_speed'] = float(m.group(1))
-                        pkt['wind_speed_mph'] = float(m.group(2))
-                        pkt['temperature'] = float(m.group(3))
-                        pkt['temperature_F'] = float(m.group(4))
+                    if m.group(2):
+                        pkt['wind_speed'] = float(m.group(2))
+                        pkt['wind_speed_mph'] = float(m.group(3))
+                        pkt['temperature'] = float(m.group(4))
                         pkt['humidity'] = float(m.group(5))
                     else:
                         loginf("Acurite5n1Packet: no match for type 38: '%s'"
-                               % payload)
+                               % payload[m.end(1) + 2:])
                 else:
                     loginf("Acurite5n1Packet: unknown message type %s"
                            " in line '%s'" % (msg_type, lines[0]))
+            elif m:
+                total = float(m.group(10))
+                pkt['rain_since_reset'] = total
+                loginf("Acurite5n1Packet: rain since reset: %s" % total)
             else:
-                m = Acurite5n1Packet.RAIN.search(payload)
-                if m:
-                    total = float(m.group(1))
-                    pkt['rain_since_reset'] = total
-                    loginf("Acurite5n1Packet: rain since reset: %s" % total)
-                else:
-                    loginf("Acurite5n1Packet: unknown message format: '%s'" %
-                           lines[0])
+                loginf("Acurite5n1Packet: unknown message format: '%s'" %
+                       lines[0])
         else:
             loginf("Acurite5n1Packet: unrecognized data: '%s'" % lines[0])
         lines.pop(0)
@@ -732,20 +881,19 @@ class AcuriteTowerPacket(Packet):
     # : 68
 
     IDENTIFIER = "Acurite tower sensor"
-    PATTERN = re.compile('0x([0-9a-fA-F]+) Ch ([A-C]): ([\d.-]+) C ([\d.-]+) F ([\d]+) % RH')
+    PATTERN = re.compile(r'0x([0-9a-fA-F]+) Ch ([A-C]): ([\d.-]+) C [\d.-]+ F ([\d]+) % RH')
 
     @staticmethod
     def parse_text(ts, payload, lines):
         pkt = dict()
-        m = AcuriteTowerPacket.PATTERN.search(lines[0])
+        m = AcuriteTowerPacket.PATTERN.search(payload)
         if m:
             pkt['dateTime'] = ts
             pkt['usUnits'] = weewx.METRIC
             pkt['hardware_id'] = m.group(1)
             pkt['channel'] = m.group(2)
             pkt['temperature'] = float(m.group(3))
-            pkt['temperature_F'] = float(m.group(4))
-            pkt['humidity'] = float(m.group(5))
+            pkt['humidity'] = float(m.group(4))
             pkt = Acurite.insert_ids(pkt, AcuriteTowerPacket.__name__)
         else:
             loginf("AcuriteTowerPacket: unrecognized data: '%s'" % lines[0])
@@ -892,19 +1040,18 @@ class Acurite986Packet(Packet):
     # IDENTIFIER = "Acurite 986 sensor"
     # IDENTIFIER = "Acurite 986 Sensor"
     IDENTIFIER = "Acurite-986"
-    PATTERN = re.compile('0x([0-9a-fA-F]+) - (1R|2F): ([\d.-]+) C ([\d.-]+) F')
+    PATTERN = re.compile(r'0x([0-9a-fA-F]+) - (1R|2F): ([\d.-]+) C [\d.-]+ F')
 
     @staticmethod
     def parse_text(ts, payload, lines):
         pkt = dict()
-        m = Acurite986Packet.PATTERN.search(lines[0])
+        m = Acurite986Packet.PATTERN.search(payload)
         if m:
             pkt['dateTime'] = ts
             pkt['usUnits'] = weewx.METRIC
             pkt['hardware_id'] = m.group(1)
             pkt['channel'] = m.group(2)
             pkt['temperature'] = float(m.group(3))
-            pkt['temperature_F'] = float(m.group(4))
         else:
             loginf("Acurite986Packet: unrecognized data: '%s'" % lines[0])
         lines.pop(0)
@@ -944,7 +1091,7 @@ class AcuriteLightningPacket(Packet):
 #    IDENTIFIER = "Acurite lightning"
 #    IDENTIFIER = "Acurite Lightning 6045M"
     IDENTIFIER = "Acurite-6045M"
-    PATTERN = re.compile('0x([0-9a-fA-F]+) Ch (.) Msg Type 0x([0-9a-fA-F]+): ([\d.-]+) ([CF]) ([\d.]+) % RH Strikes ([\d]+) Distance ([\d.]+)')
+    PATTERN = re.compile(r'0x([0-9a-fA-F]+) Ch (.) Msg Type 0x([0-9a-fA-F]+): ([\d.-]+) ([CF]) ([\d.]+) % RH Strikes ([\d]+) Distance ([\d.]+)')
 
     @staticmethod
     def parse_json(obj):
@@ -966,7 +1113,7 @@ class AcuriteLightningPacket(Packet):
     @staticmethod
     def parse_text(ts, payload, lines):
         pkt = dict()
-        m = AcuriteLightningPacket.PATTERN.search(lines[0])
+        m = AcuriteLightningPacket.PATTERN.search(payload)
         if m:
             pkt['dateTime'] = ts
             units = m.group(5)
@@ -1124,11 +1271,11 @@ class AmbientF007THPacket(Packet):
 #    IDENTIFIER = "Ambient Weather F007TH Thermo-Hygrometer"
     IDENTIFIER = "Ambientweather-F007TH"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) F'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)]}
+            'temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -1437,10 +1584,10 @@ class CalibeurRF104Packet(Packet):
 
     IDENTIFIER = "Calibeur RF-104"
     PARSEINFO = {
-        'ID': ['id', None, lambda x: int(x)],
+        'ID': ['id', None, int],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)]}
+            'temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -1613,15 +1760,15 @@ class FOWH1080Packet(Packet):
 #        'Msg type': ['msg_type', None, None],
         'StationID': ['station_id', None, None],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
+            'temperature', None, float_head],
         'Humidity': [
-            'humidity', re.compile('([\d.]+) %'), lambda x: float(x)],
+            'humidity', None, float_head],
 #        'Wind string': ['wind_dir_ord', None, None],
-        'Wind degrees': ['wind_dir', None, lambda x: int(x)],
-        'Wind avg speed': ['wind_speed', None, lambda x: float(x)],
-        'Wind gust': ['wind_gust', None, lambda x: float(x)],
-        'Total rainfall': ['rain_total', None, lambda x: float(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1]}
+        'Wind degrees': ['wind_dir', None, int],
+        'Wind avg speed': ['wind_speed', None, float],
+        'Wind gust': ['wind_gust', None, float],
+        'Total rainfall': ['rain_total', None, float],
+        'Battery': ['battery', None, battery_status]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -1723,7 +1870,7 @@ class FOWHx080Packet(Packet):
 
         if msg_type == 2:
             pkt['station_id'] = obj.get('uv_sensor_id')
-            pkt['uv_status'] = 0 if obj.get('uv_status') == 'OK' else 1
+            pkt['uv_status'] = battery_status(obj.get('uv_status'))
             pkt['uv_index'] = Packet.get_float(obj, 'uv_index')
             pkt['luminosity'] = Packet.get_float(obj, 'lux')
             pkt['radiation'] = Packet.get_float(obj, 'wm')
@@ -1761,7 +1908,7 @@ class FOWH3080Packet(Packet):
         pkt['luminosity'] = Packet.get_float(obj, 'lux')
         pkt['radiation'] = Packet.get_float(obj, 'wm')
         pkt['illumination'] = Packet.get_float(obj, 'fc')
-        pkt['uv_status'] = 0 if obj.get('uv_status') == 'OK' else 1
+        pkt['uv_status'] = battery_status(obj.get('uv_status'))
         return FOWH3080Packet.insert_ids(pkt)
 
     @staticmethod
@@ -1775,9 +1922,9 @@ class FOWH2Packet(Packet):
 
     IDENTIFIER = "Fine Offset Electronics, WH2"
     PARSEINFO = {
-        'ID': ['station_id', None, lambda x: int(x)],
+        'ID': ['station_id', None, int],
         'Temperature':
-            ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)]
+            ['temperature', None, float_head]
         }
 
     @staticmethod
@@ -1808,8 +1955,8 @@ class FOWH5Packet(Packet):
 
     IDENTIFIER = "Fine Offset WH5 sensor"
     PARSEINFO = {
-        'ID': ['station_id', None, lambda x: int(x)],
-        'Temperature': ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)]
+        'ID': ['station_id', None, int],
+        'Temperature': ['temperature', None, float_head]
     }
 
     @staticmethod
@@ -1914,12 +2061,12 @@ class FOWH25Packet(Packet):
     IDENTIFIER = "Fineoffset-WH25"
 
     PARSEINFO = {
-        'ID': ['station_id', None, lambda x: int(x)],
+        'ID': ['station_id', None, int],
         'Temperature':
-            ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)],
+            ['temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head],
         'Pressure':
-            ['pressure', re.compile('([\d.-]+) hPa'), lambda x: float(x)]}
+            ['pressure', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2287,12 +2434,12 @@ class HidekiTS04Packet(Packet):
 
     IDENTIFIER = "Hideki-TS04"
     PARSEINFO = {
-        'Rolling Code': ['rolling_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'Rolling Code': ['rolling_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)]}
+            'temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2332,13 +2479,13 @@ class HidekiWindPacket(Packet):
     IDENTIFIER = "Hideki-Wind"
 
     PARSEINFO = {
-        'Rolling Code': ['rolling_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'Rolling Code': ['rolling_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Wind Strength': ['wind_speed', re.compile('([\d.]+) km/h'), lambda x: float(x)],
-        'Direction': ['wind_dir', re.compile('([\d.]+) '), lambda x: float(x)]}
+            'temperature', None, float_head],
+        'Wind Strength': ['wind_speed', None, float_head],
+        'Direction': ['wind_dir', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2404,10 +2551,10 @@ class HidekiRainPacket(Packet):
     IDENTIFIER = "Hideki-Rain"
 
     PARSEINFO = {
-        'Rolling Code': ['rolling_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
-        'Rain': ['rain_total', re.compile('([\d.]+) '), lambda x: float(x)]}
+        'Rolling Code': ['rolling_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
+        'Rain': ['rain_total', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2531,13 +2678,13 @@ class LaCrosseWSPacket(Packet):
     IDENTIFIER = "LaCrosse WS"
     PARSEINFO = {
         'Wind speed': [
-            'wind_speed', re.compile('([\d.]+) m/s'), lambda x: float(x)],
-        'Direction': ['wind_dir', None, lambda x: float(x)],
+            'wind_speed', None, float_head],
+        'Direction': ['wind_dir', None, float],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', None, lambda x: int(x)],
+            'temperature', None, float_head],
+        'Humidity': ['humidity', None, int],
         'Rainfall': [
-            'rain_total', re.compile('([\d.]+) mm'), lambda x: float(x)]}
+            'rain_total', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2683,10 +2830,10 @@ class RubicsonTempPacket(Packet):
 
     IDENTIFIER = "Rubicson Temperature Sensor"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
-        'Temperature': ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)]}
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
+        'Temperature': ['temperature', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2752,13 +2899,13 @@ class OSPCR800Packet(Packet):
     #IDENTIFIER = "PCR800"
     IDENTIFIER = "Oregon-PCR800"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Rain Rate':
-            ['rain_rate', re.compile('([\d.]+) in'), lambda x: float(x)],
+            ['rain_rate', None, float_head],
         'Total Rain':
-            ['rain_total', re.compile('([\d.]+) in'), lambda x: float(x)]}
+            ['rain_total', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2786,12 +2933,12 @@ class OSPCR800Packet(Packet):
 class OSBTHR918Packet(Packet):
     IDENTIFIER = "BTHR918"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
-        'Temperature': ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)],
-        'Pressure': ['pressure', re.compile('([\d.]+) mbar'), lambda x: float(x)]}
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
+        'Temperature': ['temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head],
+        'Pressure': ['pressure', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2834,12 +2981,12 @@ class OSBTHR968Packet(Packet):
 
     IDENTIFIER = "BHTR968"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
-        'Temperature': ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)],
-        'Pressure': ['pressure', re.compile('([\d.]+) mbar'), lambda x: float(x)]}
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
+        'Temperature': ['temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head],
+        'Pressure': ['pressure', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2883,12 +3030,12 @@ class OSTHGR122NPacket(Packet):
 
     IDENTIFIER = "THGR122N"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)]}
+            'temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2934,14 +3081,12 @@ class OSTHGR810Packet(Packet):
 
     IDENTIFIER = "THGR810"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Celcius': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Fahrenheit': [
-            'temperature_F', re.compile('([\d.-]+) F'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)]}
+            'temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -2975,11 +3120,11 @@ class OSTHR128Packet(Packet):
 
     IDENTIFIER = "OSv1 Temperature Sensor"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Temperature':
-            ['temperature', re.compile('([\d.-]+) C'), lambda x : float(x)]}
+            ['temperature', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3011,11 +3156,11 @@ class OSTHR228NPacket(Packet):
 
     IDENTIFIER = "Oregon-THR228N"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Temperature':
-            ['temperature', re.compile('([\d.-]+) C'), lambda x : float(x)]}
+            ['temperature', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3046,11 +3191,11 @@ class OSUV800Packet(Packet):
 
     IDENTIFIER = "UV800"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'UV Index':
-            ['uv_index', re.compile('([\d.-]+) C'), lambda x : float(x)]}
+            ['uv_index', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3084,9 +3229,9 @@ class OSUVR128Packet(Packet):
 
     IDENTIFIER = "UVR128"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'UV Index': ['uv_index', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1]}
+        'House Code': ['house_code', None, int],
+        'UV Index': ['uv_index', None, float_head],
+        'Battery': ['battery', None, battery_status]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3121,15 +3266,15 @@ class OSWGR800Packet(Packet):
 
     IDENTIFIER = "WGR800"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Gust': [
-            'wind_gust', re.compile('([\d.]+) m'), lambda x: float(x)],
+            'wind_gust', None, float_head],
         'Average': [
-            'wind_speed', re.compile('([\d.]+) m'), lambda x: float(x)],
+            'wind_speed', None, float_head],
         'Direction': [
-            'wind_dir', re.compile('([\d.]+) degrees'), lambda x: float(x)]}
+            'wind_dir', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3163,10 +3308,10 @@ class OSTHN802Packet(Packet):
 
     IDENTIFIER = "THN802"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
-        'Celcius': ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)]}
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
+        'Celcius': ['temperature', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3201,12 +3346,12 @@ class OSBTHGN129Packet(Packet):
 
     IDENTIFIER = "BTHGN129"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
-        'Celcius': ['temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)],
-        'Pressure': ['pressure', re.compile('([\d.]+) mPa'), lambda x: float(x)]}
+        'House Code': ['house_code', None, int],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
+        'Celcius': ['temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head],
+        'Pressure': ['pressure', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3326,13 +3471,13 @@ class NexusTemperaturePacket(Packet):
 
     IDENTIFIER = "Nexus Temperature"
     PARSEINFO = {
-        'House Code': ['house_code', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
-                'Channel': ['channel', None, lambda x: int(x)],
+        'House Code': ['house_code', None, int],
+        'Battery': ['battery', None, battery_status],
+                'Channel': ['channel', None, int],
         'Temperature':
-            ['temperature', re.compile('([\d.-]+) C'), lambda x : float(x)],
+            ['temperature', None, float_head],
         'Humidity':
-            ['humidity', re.compile('([\d.-]+) %'), lambda x : float(x)]}
+            ['humidity', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3406,11 +3551,11 @@ class TFATwinPlus303049Packet(Packet):
 
     IDENTIFIER = "TFA-Twin-Plus-30.3049"
     PARSEINFO = {
-        'Channel': ['channel', None, lambda x: int(x)],
-        'Battery': ['battery', None, lambda x: 0 if x == 'OK' else 1],
+        'Channel': ['channel', None, int],
+        'Battery': ['battery', None, battery_status],
         'Temperature': [
-            'temperature', re.compile('([\d.-]+) C'), lambda x: float(x)],
-        'Humidity': ['humidity', re.compile('([\d.]+) %'), lambda x: float(x)]}
+            'temperature', None, float_head],
+        'Humidity': ['humidity', None, float_head]}
 
     @staticmethod
     def parse_text(ts, payload, lines):
@@ -3526,6 +3671,11 @@ class PacketFactory(object):
     # known packets will be lazy-loaded by introspecting at first request
     KNOWN_PACKETS = []
 
+    # a single pattern that matches the identifier of any known packet, and
+    # the packet for each identifier.  these are built with KNOWN_PACKETS.
+    IDENTIFIER_PATTERN = None
+    PACKET_BY_IDENTIFIER = dict()
+
     @staticmethod
     def known_packets():
         if not PacketFactory.KNOWN_PACKETS:
@@ -3534,8 +3684,24 @@ class PacketFactory(object):
             for name, obj in objs:
                 if hasattr(obj, 'IDENTIFIER'):
                     PacketFactory.KNOWN_PACKETS.append(obj)
+                    PacketFactory.PACKET_BY_IDENTIFIER.setdefault(
+                        obj.IDENTIFIER, obj)
+            PacketFactory.IDENTIFIER_PATTERN = re.compile('|'.join(
+                [re.escape(p.IDENTIFIER) for p in PacketFactory.KNOWN_PACKETS]))
         return PacketFactory.KNOWN_PACKETS
 
+    @staticmethod
+    def find_parser(label):
+        # find the packet whose identifier appears in the label.  this is a
+        # single search instead of a find for every known packet.  when one
+        # identifier contains another (WH32B and WH32), the longer one wins
+        # because it comes first in the list of known packets.
+        PacketFactory.known_packets()
+        m = PacketFactory.IDENTIFIER_PATTERN.search(label)
+        if m:
+            return PacketFactory.PACKET_BY_IDENTIFIER[m.group(0)]
+        return None
+
     @staticmethod
     def create(lines):
         # return a list of packets from the specified lines
@@ -3543,11 +3709,19 @@ class PacketFactory(object):
             pkt = None
             if lines[0].startswith('{'):
                 pkt = PacketFactory.parse_json(lines)
-                if pkt is None:
+                if pkt is None and DEBUG:
                     logdbg("punt unrecognized line '%s'" % lines[0])
                 lines.pop(0)
             else:
+                n = len(lines)
                 pkt = PacketFactory.parse_text(lines)
+                if len(lines) == n:
+                    # the parser did not consume anything, for example when a
+                    # packet type only understands json.  drop the line so
+                    # that it is not parsed again forever.
+                    if DEBUG:
+                        logdbg("punt unparsed line '%s'" % lines[0])
+                    lines.pop(0)
             if pkt is not None:
                 yield pkt
 
@@ -3556,42 +3730,44 @@ class PacketFactory(object):
         try:
             obj = json.loads(lines[0])
             if 'model' in obj:
-                for parser in PacketFactory.known_packets():
-                    if obj['model'].find(parser.IDENTIFIER) >= 0:
-                        return parser.parse_json(obj)
-                logdbg("parse_json: unknown model %s" % obj['model'])
+                parser = PacketFactory.find_parser(obj['model'])
+                if parser:
+                    return parser.parse_json(obj)
+                if DEBUG:
+                    logdbg("parse_json: unknown model %s" % obj['model'])
         except ValueError as e:
-            logdbg("parse_json failed: %s" % e)
+            if DEBUG:
+                logdbg("parse_json failed: %s" % e)
         return None
 
     @staticmethod
     def parse_text(lines):
         ts, payload = PacketFactory.parse_firstline(lines[0])
         if ts and payload:
-            logdbg("parse_text: ts=%s payload=%s" % (ts, payload))
-            for parser in PacketFactory.known_packets():
-                if payload.find(parser.IDENTIFIER) >= 0:
-                    pkt = parser.parse_text(ts, payload, lines)
+            if DEBUG:
+                logdbg("parse_text: ts=%s payload=%s" % (ts, payload))
+            parser = PacketFactory.find_parser(payload)
+            if parser:
+                pkt = parser.parse_text(ts, payload, lines)
+                if DEBUG:
                     logdbg("pkt=%s" % pkt)
-                    return pkt
-            logdbg("parse_text: unknown format: ts=%s payload=%s" %
-                   (ts, payload))
-        logdbg("parse_text failed: ts=%s payload=%s line=%s" %
-               (ts, payload, lines[0]))
+                return pkt
+            if DEBUG:
+                logdbg("parse_text: unknown format: ts=%s payload=%s" %
+                       (ts, payload))
+        if DEBUG:
+            logdbg("parse_text failed: ts=%s payload=%s line=%s" %
+                   (ts, payload, lines[0]))
         lines.pop(0)
         return None
 
-    TS_PATTERN = re.compile('(\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d)[\s]+:*(.*)')
-
     @staticmethod
     def parse_firstline(line):
         ts = payload = None
         try:
-            m = PacketFactory.TS_PATTERN.search(line)
-            if m:
-                utc = time.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
-                ts = timegm(utc)
-                payload = m.group(2).strip()
+            tstr, payload = split_timestamp(line)
+            if tstr:
+                ts = utc_to_epoch(tstr)
         except Exception as e:
             logerr("parse timestamp failed for '%s': %s" % (line, e))
         return ts, payload
@@ -3656,7 +3832,15 @@ class SDRDriver(weewx.drivers.AbstractDevice):
     TIMESTAMP_MATCH_THRESHHOLD = 1
 
     def __init__(self, **stn_dict):
+        global DEBUG
         loginf('driver version is %s' % DRIVER_VERSION)
+        # set the module-wide flag on purpose.  the parsers are staticmethods
+        # with no driver instance, and there is only one driver per process.
+        # debug may be a level such as 2 or a boolean such as 'true'.
+        try:
+            DEBUG = tobool(stn_dict.get('debug', weewx.debug))
+        except ValueError:
+            DEBUG = weewx.debug > 0
         self._model = stn_dict.get('model', 'SDR')
         loginf('model is %s' % self._model)
         self._log_lines = tobool(stn_dict.get('log_lines', False))
@@ -3664,16 +3848,18 @@ class SDRDriver(weewx.drivers.AbstractDevice):
         self._log_unmapped = tobool(stn_dict.get('log_unmapped_sensors', False))
         self._log_packets  = tobool(stn_dict.get('log_packets', True))
         self._log_dups     = tobool(stn_dict.get('log_duplicate_readings', True))
-        self._sensor_map = stn_dict.get('sensor_map', {})
+        # use a plain dict, since the lookups in a configobj section are slow
+        self._sensor_map = dict(stn_dict.get('sensor_map', {}))
         loginf('sensor map is %s' % self._sensor_map)
         self._deltas = stn_dict.get('deltas', SDRDriver.DEFAULT_DELTAS)
         loginf('deltas is %s' % self._deltas)
-        self._ts_delta = stn_dict.get('timestamp_match_threshhold', SDRDriver.TIMESTAMP_MATCH_THRESHHOLD)
+        self._ts_delta = float(stn_dict.get('timestamp_match_threshhold', SDRDriver.TIMESTAMP_MATCH_THRESHHOLD))
         self._counter_values = dict()
         cmd = stn_dict.get('cmd', DEFAULT_CMD)
         path = stn_dict.get('path', None)
         ld_library_path = stn_dict.get('ld_library_path', None)
-        self._last_pkt = None # avoid duplicate sequential packets
+        self._last_ts = None # avoid duplicate sequential packets
+        self._last_sig = None
         self._mgr = ProcManager()
         self._mgr.startup(cmd, path, ld_library_path)
 
@@ -3693,14 +3879,16 @@ class SDRDriver(weewx.drivers.AbstractDevice):
                     if packet:
                         pkt = self.map_to_fields(packet, self._sensor_map)
                         if pkt:
-                            if not self._packets_match(pkt, self._last_pkt):
-                                if self._log_packets:
+                            sig = self._get_signature(pkt)
+                            if not self._is_duplicate(pkt['dateTime'], sig):
+                                if self._log_packets and DEBUG:
                                     logdbg("packet=%s" % pkt)
-                                self._last_pkt = pkt
+                                self._last_ts = pkt['dateTime']
+                                self._last_sig = sig
                                 self._calculate_deltas(pkt)
                                 yield pkt
                             else:
-                                if self._log_dups:
+                                if self._log_dups and DEBUG:
                                     logdbg("ignoring duplicate packet %s" % pkt)
                         elif self._log_unmapped:
                             loginf("unmapped: %s" % packet)
@@ -3714,22 +3902,26 @@ class SDRDriver(weewx.drivers.AbstractDevice):
                 logerr(line)
             raise weewx.WeeWxIOError("rtl_433 process is not running")
 
-    def _packets_match(self, pkt1, pkt2):
-        # see if two packets match.  this is more than just a direct comparison
-        # of packets.  if the data match, but the timestamps are different,
-        # then that is considered different, but only if the timestamp is
-        # bigger than the sampling period for the hardware.
-        if pkt1 != pkt2:
-            return False
-        a = copy.deepcopy(pkt1)
-        b = copy.deepcopy(pkt2)
-        a_ts = a.pop('dateTime')
-        b_ts = b.pop('dateTime')
-        if a != b:
+    @staticmethod
+    def _get_signature(pkt):
+        # everything in the packet except the timestamp, in a form that can be
+        # compared quickly.  the hash of a frozenset is cached, so comparing
+        # the hashes first rejects most packets without looking at the data.
+        # this must be done before the deltas are added to the packet.
+        return frozenset([(k, pkt[k]) for k in pkt if k != 'dateTime'])
+
+    def _is_duplicate(self, ts, sig):
+        # see if a packet matches the previous packet.  if the data match, but
+        # the timestamps are different, then that is considered different, but
+        # only if the difference is bigger than the sampling period for the
+        # hardware.
+        if self._last_sig is None or hash(sig) != hash(self._last_sig):
             return False
-        if abs(a_ts - b_ts) > self._ts_delta:
+        if sig != self._last_sig:
             return False
-        return True
+        if ts is None or self._last_ts is None:
+            return ts == self._last_ts
+        return abs(ts - self._last_ts) <= self._ts_delta
 
     def _calculate_deltas(self, pkt):
         for k in self._deltas:
@@ -3757,8 +3949,11 @@ class SDRDriver(weewx.drivers.AbstractDevice):
         # skip it completely (it is not given a None value).  include the
         # time stamp and unit system only if we actually got data.
         packet = dict()
-        for n in sensor_map.keys():
-            label = SDRDriver._find_match(sensor_map[n], pkt.keys())
+        key_parts = []
+        keys_by_type = dict()
+        for n, pattern in sensor_map.items():
+            label = SDRDriver._find_match(pattern, pkt,
+                                          key_parts, keys_by_type)
             if label:
                 packet[n] = pkt.get(label)
         if packet:
@@ -3766,39 +3961,91 @@ class SDRDriver(weewx.drivers.AbstractDevice):
                 packet[k] = pkt[k]
         return packet
 
-    @staticmethod
-    def _find_match(pattern, keylist):
-        # find the first key in pkt that matches the specified pattern.
-        # the general form of a pattern is:
+    # the parts of each sensor map pattern, indexed by pattern.  if the
+    # pattern has any glob characters, each part is also translated to a
+    # compiled regex, so the translation is done once instead of for every
+    # key of every packet.  the patterns come from the sensor map, so there
+    # are only a few of them.  also note whether the packet type is a plain
+    # name, since then only the keys of that packet type can match.
+    PATTERN_PARTS = dict()
+
+    @staticmethod
+    def _split_pattern(pattern):
+        x = SDRDriver.PATTERN_PARTS.get(pattern)
+        if x is None:
+            pparts = pattern.split('.')
+            regexes = None
+            typed = False
+            if '*' in pattern or '?' in pattern or '[' in pattern:
+                regexes = [re.compile(fnmatch.translate(p)) for p in pparts]
+                typed = len(pparts) == 3 and not ('*' in pparts[2] or
+                                                  '?' in pparts[2] or
+                                                  '[' in pparts[2])
+            x = (pparts, regexes, typed)
+            SDRDriver.PATTERN_PARTS[pattern] = x
+        return x
+
+    @staticmethod
+    def _find_match(pattern, keys, key_parts=None, keys_by_type=None):
+        # find the first of keys (the packet, or a list of its keys) that
+        # matches the specified pattern.  the general form of a pattern is:
         #   <observation_name>.<sensor_id>.<packet_type>
-        # do glob-style matching.
-        if pattern in keylist:
+        # do glob-style matching.  key_parts and keys_by_type are filled in
+        # the first time they are needed, so when the caller passes the same
+        # ones for each pattern, the keys are split only once.  the layout is:
+        #   key_parts: [(key, key.split('.')), ...] for every key, in order
+        #   keys_by_type: {packet_type: [(key, parts), ...]} for 3-part keys
+        if pattern in keys:
             return pattern
         match = None
-        pparts = pattern.split('.')
-        if len(pparts) == 3:
-            for k in keylist:
-                kparts = k.split('.')
-                if (len(kparts) == 3 and
-                    SDRDriver._part_match(pparts[0], kparts[0]) and
-                    SDRDriver._part_match(pparts[1], kparts[1]) and
-                    SDRDriver._part_match(pparts[2], kparts[2])):
-                    match = k
-                    break
-                elif pparts[0] == k:
-                    match = k
-                    break
+        pparts, regexes, typed = SDRDriver._split_pattern(pattern)
+        if len(pparts) == 3 and regexes is None:
+            # a pattern without wildcards can only match itself, so there is
+            # no need to look at every key.  all that is left is a key that
+            # is the bare observation name.
+            if pparts[0] in keys:
+                match = pparts[0]
+        elif len(pparts) == 3:
+            if key_parts is None:
+                key_parts = []
+            if keys_by_type is None:
+                keys_by_type = dict()
+            if not key_parts:
+                for k in keys:
+                    kparts = k.split('.')
+                    key_parts.append((k, kparts))
+                    if len(kparts) == 3:
+                        keys_by_type.setdefault(kparts[2], []).append(
+                            (k, kparts))
+            if typed and pparts[0] not in keys:
+                # the packet type has no wildcards, so only the keys for that
+                # packet type can match.  a packet usually has only one type,
+                # so this skips the whole packet when the type is different.
+                # if there is a key that is the bare observation name, fall
+                # through to the scan, so that the first key still wins.
+                for k, kparts in keys_by_type.get(pparts[2], []):
+                    if (regexes[0].match(kparts[0]) and
+                        regexes[1].match(kparts[1])):
+                        match = k
+                        break
+            else:
+                for k, kparts in key_parts:
+                    if (len(kparts) == 3 and
+                        regexes[0].match(kparts[0]) and
+                        regexes[1].match(kparts[1]) and
+                        regexes[2].match(kparts[2])):
+                        match = k
+                        break
+                    elif pparts[0] == k:
+                        match = k
+                        break
         return match
 
-    @staticmethod
-    def _part_match(pattern, value):
-        # use glob matching for parts of the tuple
-        matches = fnmatch.filter([value], pattern)
-        return True if matches else False
-
 
 def main():
+    global DEBUG
     import optparse
+    import sys
     import syslog
 
     usage = """%prog [--debug] [--help] [--version]
@@ -3838,16 +4085,17 @@ Hide:
 
     if options.version:
         print("sdr driver version %s" % DRIVER_VERSION)
-        exit(1)
+        sys.exit(1)
 
     if options.debug:
+        DEBUG = True
         syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_DEBUG))
 
     sensor_map = dict()
     if options.config:
         import weecfg
         config_path, config_dict = weecfg.read_config(options.config)
-        sensor_map = config_dict.get('SDR', {}).get('sensor_map', {})
+        sensor_map = dict(config_dict.get('SDR', {}).get('sensor_map', {}))
 
     if options.action == 'list-supported':
         pkt_names = PacketFactory.known_packets()
@@ -3866,8 +4114,9 @@ Hide:
                 if p:
                     del p['usUnits']
                     del p['dateTime']
-                    keys = p.keys()
-                    label = re.sub(r'^[^\.]+', '', keys[0])
+                    if not p:
+                        continue
+                    label = re.sub(r'^[^\.]+', '', next(iter(p)))
                     if label not in detected:
                         detected[label] = 0
                     detected[label] += 1
@@ -0,0 +1,54 @@
+# tests for the weewx-sdr driver
+# Copyright 2016-2024 Matthew Wall
+# Distributed under the terms of the GNU Public License (GPLv3)
+#
+# weewx must be importable, for example:
+#   PYTHONPATH=/path/to/weewx/bin python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'bin'))
+
+import user.sdr as sdr
+
+
+class TimestampTest(unittest.TestCase):
+
+    def setUp(self):
+        # record errors instead of sending them to the log
+        self.errors = []
+        self.logerr = sdr.logerr
+        sdr.logerr = self.errors.append
+
+    def tearDown(self):
+        sdr.logerr = self.logerr
+
+    def test_parse_time(self):
+        self.assertEqual(sdr.Packet.parse_time('2016-08-30 23:57:25'),
+                         1472601445)
+        self.assertEqual(self.errors, [])
+
+    def test_parse_time_iso(self):
+        # rtl_433 -M time:iso is not understood, but must not log an error
+        self.assertIsNone(sdr.Packet.parse_time('2019-08-07T14:04:58'))
+        self.assertEqual(self.errors, [])
+
+    def test_json_time_iso(self):
+        line = '{"time" : "2019-08-07T14:04:58", "model" : "Acurite-Tower", "id" : 11041, "channel" : "B", "battery_ok" : 1, "temperature_C" : -3.500, "humidity" : 71}'
+        pkts = list(sdr.PacketFactory.create([line]))
+        self.assertEqual(len(pkts), 1)
+        self.assertIsNone(pkts[0]['dateTime'])
+        self.assertEqual(self.errors, [])
+
+    def test_has_timestamp(self):
+        self.assertTrue(sdr.has_timestamp('2016-08-30 23:57:25'))
+        for s in ['2019-08-07T14:04:58', '2016-08-30 23:57', '2016/08/30 23:57:25',
+                  '2016-08-30 23:57:2x', '@0.512s']:
+            self.assertFalse(sdr.has_timestamp(s), s)
+
+
+if __name__ == '__main__':
+    unittest.main()